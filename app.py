@@ -1,24 +1,63 @@
 import os
+import contextlib
+import functools
+import gc
+import hashlib
+import json
+import queue
+import shutil
+import subprocess
+import threading
 import time
 import uuid
+import warnings
+from importlib import metadata
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 
 from flask import Flask, request, send_file, jsonify, send_from_directory, abort
 from werkzeug.utils import secure_filename
 import torch
+import torch.nn.functional as F
 from carvekit.api.high import HiInterface
-from PIL import Image, UnidentifiedImageError
+from carvekit.ml.wrap.tracer_b7 import TracerUniversalB7
+from carvekit.ml.wrap.u2net import U2NET
+from carvekit.utils.models_utils import get_precision_autocast, cast_network
+from PIL import Image, UnidentifiedImageError, features
+import numpy as np
+
+# Optional OpenCV (installed with carvekit) for faster alpha feathering
+try:
+    import cv2
+except Exception:
+    cv2 = None
+
+# Optional nvJPEG decode through torchvision
+try:
+    from torchvision.io import decode_jpeg, ImageReadMode
+except Exception:
+    decode_jpeg = None
+
+# Optional libvips PNG encoder (faster DEFLATE than Pillow); falls back to Pillow
+try:
+    import pyvips
+except Exception:
+    pyvips = None
 
 # Configuration
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
 MAX_CONTENT_LENGTH_MB = float(os.getenv("MAX_UPLOAD_SIZE_MB", "10"))
 MAX_CONTENT_LENGTH = int(MAX_CONTENT_LENGTH_MB * 1024 * 1024)  # per request
+JPEG_DRAFT = os.getenv("JPEG_DRAFT", "1") == "1"  # reduced-scale JPEG decode for very large photos
+MAX_IMAGE_PIXELS = max(0, int(os.getenv("MAX_IMAGE_PIXELS", "50000000")))  # width*height per image, 0 = no limit
 PROCESSED_DIR = os.getenv("PROCESSED_DIR", "processed")
 STATIC_DIR = os.getenv("STATIC_DIR", ".")  # current project root contains index.html, script.js, style.css
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "5001"))
 DEBUG = os.getenv("FLASK_DEBUG", "0") == "1"
+USE_SENDFILE = os.getenv("USE_SENDFILE", "0") == "1"
 
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 
@@ -46,6 +85,59 @@ DEFAULT_CARVEKIT_CONFIG = {
 # Optional PNG compression level (0-9). 6 is a good balance.
 PNG_COMPRESS_LEVEL = max(0, min(9, int(os.getenv("PNG_COMPRESS_LEVEL", "6"))))
 
+# Serve lossy-RGB/lossless-alpha WebP to clients that send "Accept: image/webp"
+WEBP_OUTPUT = os.getenv("WEBP_OUTPUT", "1") == "1" and features.check("webp")
+WEBP_QUALITY = max(0, min(100, int(os.getenv("WEBP_QUALITY", "90"))))
+
+# Save /upload PNGs fast (level 1) and shrink them afterwards with zopflipng in the background.
+# "auto" enables it when zopflipng is on PATH; PNG_COMPRESS_LEVEL then only applies to /remove-background.
+ZOPFLIPNG = shutil.which(os.getenv("ZOPFLIPNG_BIN", "zopflipng"))
+PNG_RECOMPRESS = (os.getenv("PNG_RECOMPRESS", "auto").lower() in ("1", "auto")) and ZOPFLIPNG is not None
+PNG_RECOMPRESS_ITERATIONS = max(1, int(os.getenv("PNG_RECOMPRESS_ITERATIONS", "5")))
+# One filter strategy = one slow zopfli pass (zopflipng's default tries several)
+PNG_RECOMPRESS_FILTERS = os.getenv("PNG_RECOMPRESS_FILTERS", "m")
+# Larger outputs, or outputs arriving while this many jobs are pending, are saved at PNG_COMPRESS_LEVEL instead
+PNG_RECOMPRESS_MAX_PIXELS = max(0, int(os.getenv("PNG_RECOMPRESS_MAX_PIXELS", str(2048 * 2048))))
+PNG_RECOMPRESS_MAX_PENDING = max(1, int(os.getenv("PNG_RECOMPRESS_MAX_PENDING", "8")))
+
+# Worker threads for post-processing + PNG encoding of batch outputs
+ENCODE_WORKERS = max(1, int(os.getenv("ENCODE_WORKERS", str(max(2, (os.cpu_count() or 2) // 2)))))
+_ENCODE_POOL = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+
+# Optional torch.compile of the segmentation/matting networks (slow first call per shape)
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "0") == "1"
+TORCH_COMPILE_MODE = os.getenv("TORCH_COMPILE_MODE", "reduce-overhead")
+
+# Optional CUDA Graphs replay of the network forward for repeated input shapes (CUDA only)
+CUDA_GRAPHS = os.getenv("CUDA_GRAPHS", "0") == "1"
+CUDA_GRAPHS_MAX_SHAPES = max(1, int(os.getenv("CUDA_GRAPHS_MAX_SHAPES", "4")))
+
+# Batch segmentation inputs into one device tensor instead of carvekit's per-image path
+GPU_PREPROCESS = (os.getenv("GPU_PREPROCESS", "auto").lower() == "1") or (
+    os.getenv("GPU_PREPROCESS", "auto").lower() == "auto" and torch.cuda.is_available()
+)
+_IMAGENET_MEAN = (0.485, 0.456, 0.406)
+_IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# LRU of finished outputs keyed by input content + config (0 disables); persisted across restarts
+RESULT_CACHE_SIZE = max(0, int(os.getenv("RESULT_CACHE_SIZE", "256")))
+RESULT_CACHE_FILE = os.getenv("RESULT_CACHE_FILE", os.path.join(PROCESSED_DIR, ".result_cache.json"))
+
+# Decode JPEG uploads on the GPU with nvJPEG (opt-in: the matting stage still needs a host copy)
+NVJPEG = os.getenv("NVJPEG", "0") == "1" and decode_jpeg is not None and torch.cuda.is_available()
+
+# NHWC weights/activations for Tensor-Core conv kernels ("auto" = on with CUDA)
+CHANNELS_LAST = (os.getenv("CHANNELS_LAST", "auto").lower() == "1") or (
+    os.getenv("CHANNELS_LAST", "auto").lower() == "auto" and torch.cuda.is_available()
+)
+
+# Keep interfaces in pinned host memory and move only the one in use onto the GPU
+OFFLOAD_INTERFACES = os.getenv("OFFLOAD_INTERFACES", "0") == "1" and torch.cuda.is_available()
+_INTERFACE_DEVICE = "cpu" if OFFLOAD_INTERFACES or not torch.cuda.is_available() else "cuda"
+
+# Cross-request dynamic batching: wait up to this long for other requests' images (0 disables)
+BATCH_WINDOW_MS = max(0.0, float(os.getenv("BATCH_WINDOW_MS", "5")))
+
 # Enable TF32 on Ampere+ for speed if available
 try:
     if torch.cuda.is_available():
@@ -60,6 +152,163 @@ except Exception:
     pass
 
 
+def _save_png(img: Image.Image, dest, compress_level: int = PNG_COMPRESS_LEVEL) -> None:
+    """Encode an RGBA image as PNG to a path or writable file object."""
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    if pyvips is not None:
+        try:
+            arr = np.ascontiguousarray(np.asarray(img))
+            h, w = arr.shape[:2]
+            vimg = pyvips.Image.new_from_memory(arr.data, w, h, 4, "uchar")
+            # Adaptive row filtering like Pillow/libpng (libvips defaults to none, which is much larger)
+            opts = {"compression": compress_level, "filter": pyvips.enums.ForeignPngFilter.ALL}
+            if pyvips.at_least_libvips(8, 15):
+                opts["keep"] = pyvips.enums.ForeignKeep.NONE
+            else:
+                opts["strip"] = True  # pre-8.15 spelling of keep="none"
+            if isinstance(dest, str):
+                vimg.pngsave(dest, **opts)
+            else:
+                dest.write(vimg.pngsave_buffer(**opts))
+            return
+        except Exception:
+            pass  # fall back to Pillow
+    img.save(dest, format="PNG", compress_level=compress_level)
+
+
+def _save_webp(img: Image.Image, dest) -> None:
+    """Encode an RGBA image as WebP to a path or writable file object."""
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    img.save(dest, format="WEBP", quality=WEBP_QUALITY, method=4, lossless=False, exact=False)
+
+
+def _recompress_png(path: str) -> None:
+    """Rewrite a saved PNG with zopflipng, replacing it atomically only if it got smaller."""
+    tmp_path = f"{path}.zopfli.tmp"
+    try:
+        subprocess.run(
+            [ZOPFLIPNG, "-y", f"--iterations={PNG_RECOMPRESS_ITERATIONS}",
+             f"--filters={PNG_RECOMPRESS_FILTERS}", path, tmp_path],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        if os.path.getsize(tmp_path) < os.path.getsize(path):
+            os.replace(tmp_path, path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"PNG recompress failed for {path}: {e}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Bounded backlog: a slot is taken before saving at level 1 and released once the job is done.
+# The worker is a daemon thread so pending jobs never hold up shutdown (files just stay at level 1).
+_RECOMPRESS_QUEUE: "queue.Queue[str]" = queue.Queue()
+_RECOMPRESS_SLOTS = threading.BoundedSemaphore(PNG_RECOMPRESS_MAX_PENDING)
+
+
+def _recompress_worker() -> None:
+    while True:
+        path = _RECOMPRESS_QUEUE.get()
+        try:
+            _recompress_png(path)
+        except Exception as e:
+            # Keep the worker alive; a dead worker would leak slots and stop recompression for good
+            print(f"PNG recompress failed for {path}: {e}")
+        finally:
+            _RECOMPRESS_SLOTS.release()
+
+
+def _reserve_recompress(img: Image.Image) -> bool:
+    """Take a recompress slot for img if recompression is on, it is small enough and the backlog has room."""
+    if not PNG_RECOMPRESS or img.width * img.height > PNG_RECOMPRESS_MAX_PIXELS:
+        return False
+    return _RECOMPRESS_SLOTS.acquire(blocking=False)
+
+
+if PNG_RECOMPRESS:
+    threading.Thread(target=_recompress_worker, name="recompress", daemon=True).start()
+
+
+_RESULT_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_RESULT_CACHE_LOCK = threading.Lock()
+
+
+def _result_cache_settings() -> str:
+    """Fingerprint of process-wide settings and versions that change outputs; a persisted cache must match it."""
+    try:
+        carvekit_version = metadata.version("carvekit")
+    except metadata.PackageNotFoundError:
+        carvekit_version = "unknown"
+    return repr((carvekit_version, JPEG_DRAFT, WEBP_QUALITY, NVJPEG, GPU_PREPROCESS))
+
+
+_RESULT_CACHE_SETTINGS = _result_cache_settings()
+
+
+def _result_cache_key(content_digest: str, interface_key: Tuple, post_args: Tuple) -> str:
+    """Key an output by input bytes digest plus everything that changes the output."""
+    return hashlib.blake2b(f"{content_digest}|{interface_key!r}|{post_args!r}".encode(), digest_size=16).hexdigest()
+
+
+def _load_result_cache() -> None:
+    """Restore the result cache sidecar, dropping entries whose output file is gone.
+
+    The whole sidecar is ignored if it was written under different settings or is malformed.
+    """
+    try:
+        with open(RESULT_CACHE_FILE, "r", encoding="utf-8") as fh:
+            saved = json.load(fh)
+    except (OSError, ValueError):
+        return
+    if not isinstance(saved, dict) or saved.get("settings") != _RESULT_CACHE_SETTINGS:
+        return
+    try:
+        entries = [(str(key), str(name)) for key, name in saved["entries"][-RESULT_CACHE_SIZE:]]
+    except (KeyError, TypeError, ValueError):
+        return
+    with _RESULT_CACHE_LOCK:
+        for key, name in entries:
+            if os.path.isfile(os.path.join(PROCESSED_DIR, name)):
+                _RESULT_CACHE[key] = name
+
+
+def _result_cache_get(key: str) -> Optional[str]:
+    """Return the cached output filename for key, if its file still exists."""
+    with _RESULT_CACHE_LOCK:
+        name = _RESULT_CACHE.get(key)
+        if name is None:
+            return None
+        if not os.path.isfile(os.path.join(PROCESSED_DIR, name)):
+            del _RESULT_CACHE[key]
+            return None
+        _RESULT_CACHE.move_to_end(key)
+        return name
+
+
+def _result_cache_put(entries: List[Tuple[str, str]]) -> None:
+    """Insert (key, output filename) pairs, evict beyond RESULT_CACHE_SIZE and persist."""
+    with _RESULT_CACHE_LOCK:
+        for key, name in entries:
+            _RESULT_CACHE[key] = name
+            _RESULT_CACHE.move_to_end(key)
+        while len(_RESULT_CACHE) > RESULT_CACHE_SIZE:
+            _RESULT_CACHE.popitem(last=False)
+        snapshot = list(_RESULT_CACHE.items())
+        try:
+            tmp_path = f"{RESULT_CACHE_FILE}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump({"settings": _RESULT_CACHE_SETTINGS, "entries": snapshot}, fh)
+            os.replace(tmp_path, RESULT_CACHE_FILE)
+        except OSError as e:
+            print(f"Failed to persist result cache: {e}")
+
+
+if RESULT_CACHE_SIZE:
+    _load_result_cache()
+
+
 def _normalized_interface_key(config: dict) -> Tuple:
     """Build a hashable key for interface-affecting params only."""
     base = {
@@ -77,10 +326,15 @@ def _normalized_interface_key(config: dict) -> Tuple:
     return tuple(sorted(base.items()))
 
 
+_DEFAULT_KEY = _normalized_interface_key(DEFAULT_CARVEKIT_CONFIG)
+
+
 # Very small LRU cache for interfaces to avoid heavy re-inits across presets
-_INTERFACE_CACHE: Dict[Tuple, HiInterface] = {}
-_INTERFACE_CACHE_ORDER: List[Tuple] = []
+_INTERFACE_CACHE: "OrderedDict[Tuple, HiInterface]" = OrderedDict()
+_INTERFACE_CACHE_LOCK = threading.Lock()
 _INTERFACE_CACHE_MAX = max(2, int(os.getenv("INTERFACE_CACHE_SIZE", "4")))
+# Free VRAM required before loading another interface (Tracer-B7/U2NET + FBA, fp16 buffers included)
+ESTIMATED_MODEL_BYTES = int(os.getenv("ESTIMATED_MODEL_BYTES", str(int(2.5 * 1024 ** 3))))
 
 
 def create_interface(config=None):
@@ -91,7 +345,7 @@ def create_interface(config=None):
         object_type=config.get("object_type", DEFAULT_CARVEKIT_CONFIG["object_type"]),
         batch_size_seg=config.get("batch_size_seg", DEFAULT_CARVEKIT_CONFIG["batch_size_seg"]),
         batch_size_matting=config.get("batch_size_matting", DEFAULT_CARVEKIT_CONFIG["batch_size_matting"]),
-        device='cuda' if torch.cuda.is_available() else 'cpu',
+        device=_INTERFACE_DEVICE,
         seg_mask_size=config.get("seg_mask_size", DEFAULT_CARVEKIT_CONFIG["seg_mask_size"]),
         matting_mask_size=config.get("matting_mask_size", DEFAULT_CARVEKIT_CONFIG["matting_mask_size"]),
         trimap_prob_threshold=config.get("trimap_prob_threshold", DEFAULT_CARVEKIT_CONFIG["trimap_prob_threshold"]),
@@ -100,28 +354,447 @@ def create_interface(config=None):
         fp16=config.get("fp16", DEFAULT_CARVEKIT_CONFIG["fp16"])
     )
 
+def _interface_networks(iface: HiInterface) -> List[torch.nn.Module]:
+    """Return the torch networks (segmentation + matting) wrapped by a HiInterface."""
+    nets = [iface.segmentation_pipeline, getattr(iface.postprocessing_pipeline, "matting_module", None)]
+    return [n for n in nets if isinstance(n, torch.nn.Module)]
+
+
+def _channels_last_inputs(_module, args):
+    return tuple(
+        a.contiguous(memory_format=torch.channels_last) if isinstance(a, torch.Tensor) and a.dim() == 4 else a
+        for a in args
+    )
+
+
+def _to_channels_last(iface: HiInterface) -> None:
+    """Store network weights as NHWC (fp16 where carvekit runs fp16) and feed them NHWC inputs."""
+    for net in _interface_networks(iface):
+        net.to(memory_format=torch.channels_last)
+        if getattr(net, "fp16", False) and "cuda" in str(net.device):
+            net.half()
+        net.register_forward_pre_hook(_channels_last_inputs)
+
+
+def _compile_interface(iface: HiInterface) -> None:
+    """Compile each network's forward; carvekit's own pre/post-processing stays eager."""
+    if not hasattr(torch, "compile"):
+        return
+    for net in _interface_networks(iface):
+        try:
+            net.forward = torch.compile(net.forward, mode=TORCH_COMPILE_MODE, fullgraph=False)
+        except Exception as e:
+            print(f"torch.compile failed for {type(net).__name__}: {e}")
+
+
+def _map_outputs(out, fn):
+    """Apply fn to a tensor or to each tensor of a tuple/list network output."""
+    if isinstance(out, torch.Tensor):
+        return fn(out)
+    return type(out)(fn(o) for o in out)
+
+
+def _enable_cuda_graphs(net: torch.nn.Module) -> None:
+    """Replace net.forward with CUDA Graph replay, one graph per (input shapes, dtypes, autocast).
+
+    Graphs are captured at the network's configured batch size; smaller batches are
+    padded into the static inputs and sliced on output. Inputs on CPU and shapes beyond
+    CUDA_GRAPHS_MAX_SHAPES run eagerly.
+    """
+    eager_forward = net.forward
+    max_batch = max(1, int(getattr(net, "batch_size", 1)))
+    graphs: Dict[Tuple, Tuple] = {}
+    lock = threading.Lock()
+
+    def _static_like(a: torch.Tensor) -> torch.Tensor:
+        # Keep the source layout so NHWC inputs (CHANNELS_LAST) are captured as NHWC
+        fmt = torch.contiguous_format
+        if a.dim() == 4 and not a.is_contiguous() and a.is_contiguous(memory_format=torch.channels_last):
+            fmt = torch.channels_last
+        return torch.empty((max_batch,) + tuple(a.shape[1:]), dtype=a.dtype, device=a.device,
+                           memory_format=fmt).zero_()
+
+    def _capture(args):
+        static_in = [_static_like(a) for a in args]
+        for dst, src in zip(static_in, args):
+            dst[:src.shape[0]].copy_(src)
+        # Weights are already cast by carvekit; autocast weight caching must be off while capturing
+        autocast = torch.autocast("cuda", dtype=torch.get_autocast_gpu_dtype(),
+                                  enabled=torch.is_autocast_enabled(), cache_enabled=False)
+        side = torch.cuda.Stream()
+        side.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(side), autocast:
+            for _ in range(2):
+                eager_forward(*static_in)
+        torch.cuda.current_stream().wait_stream(side)
+        graph = torch.cuda.CUDAGraph()
+        # thread_local: other request threads may launch CUDA work while we capture
+        with torch.cuda.graph(graph, capture_error_mode="thread_local"), autocast:
+            static_out = eager_forward(*static_in)
+        return graph, static_in, static_out
+
+    def forward(*args):
+        if not args or not all(isinstance(a, torch.Tensor) and a.is_cuda for a in args) or args[0].shape[0] > max_batch:
+            return eager_forward(*args)
+        b = args[0].shape[0]
+        key = (tuple((tuple(a.shape[1:]), a.dtype) for a in args), torch.is_autocast_enabled())
+        with lock:
+            entry = graphs.get(key)
+            if entry is None:
+                if len(graphs) >= CUDA_GRAPHS_MAX_SHAPES:
+                    return eager_forward(*args)
+                entry = graphs[key] = _capture(args)
+            graph, static_in, static_out = entry
+            for dst, src in zip(static_in, args):
+                dst[:b].copy_(src)
+            graph.replay()
+            return _map_outputs(static_out, lambda t: t[:b].clone())
+
+    net.forward = forward
+    net._cuda_graphs = graphs
+
+
+def _evict_oldest_interface() -> bool:
+    """Drop the least recently used interface and hand its VRAM back (cache lock held).
+
+    The default interface is never evicted: the module-level `interface` keeps it
+    alive, so dropping it from the cache would free nothing. Returns False when
+    there is nothing left to evict.
+    """
+    victim = next((k for k in _INTERFACE_CACHE if k != _DEFAULT_KEY), None)
+    if victim is None:
+        return False
+    del _INTERFACE_CACHE[victim]
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+        torch.cuda.ipc_collect()
+    return True
+
+
+def _cuda_free_bytes() -> Optional[int]:
+    try:
+        return torch.cuda.mem_get_info()[0]
+    except Exception:
+        return None
+
+
 def get_or_create_interface(config: dict) -> HiInterface:
     key = _normalized_interface_key(config)
-    if key in _INTERFACE_CACHE:
-        # bump LRU
-        try:
-            _INTERFACE_CACHE_ORDER.remove(key)
-        except ValueError:
+    with _INTERFACE_CACHE_LOCK:
+        if key in _INTERFACE_CACHE:
+            # bump LRU
+            _INTERFACE_CACHE.move_to_end(key)
+            return _INTERFACE_CACHE[key]
+        # Make room on the GPU before loading another model (offloaded interfaces load on CPU)
+        if torch.cuda.is_available() and not OFFLOAD_INTERFACES:
+            free = _cuda_free_bytes()
+            while free is not None and free < ESTIMATED_MODEL_BYTES and _evict_oldest_interface():
+                freed = _cuda_free_bytes()
+                # Stop once evicting stops helping (e.g. interfaces still held by in-flight requests)
+                if freed is None or freed <= free:
+                    break
+                free = freed
+        # Create and insert
+        iface = create_interface(dict(key))
+        if CHANNELS_LAST:
+            _to_channels_last(iface)
+        if TORCH_COMPILE:
+            _compile_interface(iface)
+        elif CUDA_GRAPHS and torch.cuda.is_available():
+            # torch.compile's reduce-overhead mode already uses CUDA Graphs
+            for net in _interface_networks(iface):
+                _enable_cuda_graphs(net)
+        _INTERFACE_CACHE[key] = iface
+        # evict
+        while len(_INTERFACE_CACHE) > _INTERFACE_CACHE_MAX and _evict_oldest_interface():
             pass
-        _INTERFACE_CACHE_ORDER.append(key)
-        return _INTERFACE_CACHE[key]
-    # Create and insert
-    iface = create_interface(dict(key))
-    _INTERFACE_CACHE[key] = iface
-    _INTERFACE_CACHE_ORDER.append(key)
-    # evict
-    while len(_INTERFACE_CACHE_ORDER) > _INTERFACE_CACHE_MAX:
-        old = _INTERFACE_CACHE_ORDER.pop(0)
+        return iface
+
+def _named_tensors(net: torch.nn.Module) -> List[Tuple[str, torch.Tensor]]:
+    return list(net.named_parameters()) + list(net.named_buffers())
+
+
+def set_device(iface: HiInterface, device: str) -> None:
+    """Move an interface's networks between host and GPU.
+
+    The first move to CPU snapshots the weights into pinned host tensors; later
+    offloads just point the parameters back at them, and loads copy them to the
+    GPU asynchronously.
+    """
+    with torch.inference_mode():
+        for net in _interface_networks(iface):
+            if device == "cpu":
+                host = getattr(net, "_host_tensors", None)
+                if host is None:
+                    net.to("cpu")
+                    host = net._host_tensors = {name: t.pin_memory() for name, t in _named_tensors(net)}
+                for name, t in _named_tensors(net):
+                    t.data = host[name]
+            else:
+                net.to(device, non_blocking=True)
+                if CHANNELS_LAST:
+                    net.to(memory_format=torch.channels_last)
+            net.device = device
+            graphs = getattr(net, "_cuda_graphs", None)
+            if graphs:
+                graphs.clear()  # captured graphs reference the previous weight addresses
+    iface.device = device
+    if iface.postprocessing_pipeline is not None:
+        iface.postprocessing_pipeline.device = device
+
+
+_GPU_RESIDENT: Optional[HiInterface] = None
+_GPU_ACTIVE = 0
+_GPU_RESIDENCY = threading.Condition()
+
+
+@contextlib.contextmanager
+def gpu_resident(iface: HiInterface):
+    """Keep iface on the GPU for the duration of the block (no-op unless OFFLOAD_INTERFACES).
+
+    Only one interface is resident at a time; switching waits for in-flight
+    calls on the current one and offloads it to host memory.
+    """
+    global _GPU_RESIDENT, _GPU_ACTIVE
+    if not OFFLOAD_INTERFACES:
+        yield iface
+        return
+    with _GPU_RESIDENCY:
+        while _GPU_RESIDENT is not iface and _GPU_ACTIVE > 0:
+            _GPU_RESIDENCY.wait()
+        if _GPU_RESIDENT is not iface:
+            if _GPU_RESIDENT is not None:
+                set_device(_GPU_RESIDENT, "cpu")
+            set_device(iface, "cuda")
+            _GPU_RESIDENT = iface
+        _GPU_ACTIVE += 1
+    try:
+        yield iface
+    finally:
+        with _GPU_RESIDENCY:
+            _GPU_ACTIVE -= 1
+            _GPU_RESIDENCY.notify_all()
+
+
+# Pinned host staging buffers keyed by (batch, h, w, 3); two per shape for double-buffering
+_PINNED_POOL: Dict[Tuple[int, ...], List[torch.Tensor]] = {}
+_PINNED_POOL_LOCK = threading.Lock()
+_PINNED_POOL_DEPTH = 2
+
+
+def _acquire_pinned(shape: Tuple[int, ...]) -> torch.Tensor:
+    with _PINNED_POOL_LOCK:
+        free = _PINNED_POOL.get(shape)
+        if free:
+            return free.pop()
+    return torch.empty(shape, dtype=torch.uint8, pin_memory=True)
+
+
+def _release_pinned(buf: torch.Tensor) -> None:
+    with _PINNED_POOL_LOCK:
+        free = _PINNED_POOL.setdefault(tuple(buf.shape), [])
+        if len(free) < _PINNED_POOL_DEPTH:
+            free.append(buf)
+
+
+def _stage_batch(pil_images: List[Image.Image], decoded: List[Optional[torch.Tensor]], size: Tuple[int, int],
+                 device, resample, max_batch: int, copy_stream) -> Tuple[torch.Tensor, torch.Tensor, "torch.cuda.Event"]:
+    """Resize images into a pinned staging buffer and start its async copy to device.
+
+    Rows whose image was already decoded on the GPU are left unfilled; the caller
+    resizes those on device. Returns (staging buffer, uint8 NCHW device tensor,
+    event recorded after the copy).
+    """
+    w, h = size
+    buf = _acquire_pinned((max_batch, h, w, 3))
+    host = buf.numpy()
+    for i, im in enumerate(pil_images):
+        if decoded[i] is not None:
+            continue
+        host[i] = np.asarray((im if im.mode == "RGB" else im.convert("RGB")).resize(size, resample))
+    with torch.cuda.stream(copy_stream):
+        x = buf[:len(pil_images)].to(device, non_blocking=True).permute(0, 3, 1, 2)
+        ready = torch.cuda.Event()
+        ready.record(copy_stream)
+    return buf, x, ready
+
+
+def _segment_batch(seg: torch.nn.Module, pil_images: List[Image.Image],
+                   decoded: List[Optional[torch.Tensor]]) -> List[Image.Image]:
+    """Run carvekit's Tracer-B7 / U2NET segmentation with batched on-device normalization."""
+    is_u2net = isinstance(seg, U2NET)
+    # Mirror the resampling each carvekit wrapper uses for its own pre/post-processing
+    resample = Image.BICUBIC if is_u2net else Image.BILINEAR
+    size = tuple(seg.input_image_size)
+    mean = torch.tensor(_IMAGENET_MEAN, device=seg.device).view(1, 3, 1, 1)
+    std = torch.tensor(_IMAGENET_STD, device=seg.device).view(1, 3, 1, 1)
+    if is_u2net:
+        autocast = contextlib.nullcontext()  # carvekit runs U2NET in fp32
+    else:
+        autocast, dtype = get_precision_autocast(device=seg.device, fp16=seg.fp16)
+        cast_network(seg, dtype)
+
+    # Copies run on a side stream; the next chunk is staged while the current one computes
+    copy_stream = torch.cuda.Stream(device=seg.device)
+    starts = range(0, len(pil_images), seg.batch_size)
+    chunks = [pil_images[i:i + seg.batch_size] for i in starts]
+    dec_chunks = [decoded[i:i + seg.batch_size] for i in starts]
+    interp = "bicubic" if is_u2net else "bilinear"
+    masks: List[Image.Image] = []
+    with autocast, torch.no_grad():
+        pending = _stage_batch(chunks[0], dec_chunks[0], size, seg.device, resample, seg.batch_size, copy_stream)
+        for idx, chunk in enumerate(chunks):
+            buf, x, ready = pending
+            compute_stream = torch.cuda.current_stream(seg.device)
+            compute_stream.wait_event(ready)
+            x.record_stream(compute_stream)
+            x = x.float()
+            for i, t in enumerate(dec_chunks[idx]):
+                if t is not None:
+                    x[i] = F.interpolate(t[None].float(), size=(size[1], size[0]), mode=interp,
+                                         antialias=True, align_corners=False)[0].clamp(0, 255)
+            if is_u2net:
+                x = x / x.amax(dim=(1, 2, 3), keepdim=True).clamp(min=1e-8)
+            else:
+                x = x / 255.0
+            x = (x - mean) / std
+            if CHANNELS_LAST:
+                x = x.contiguous(memory_format=torch.channels_last)
+            # carvekit's wrappers override __call__ to take PIL images; go straight to the
+            # module call (keeps the channels_last pre-hook and a compiled/graphed forward)
+            out = torch.nn.Module.__call__(seg, x)
+            if idx + 1 < len(chunks):
+                pending = _stage_batch(chunks[idx + 1], dec_chunks[idx + 1], size, seg.device, resample, seg.batch_size, copy_stream)
+            if is_u2net:
+                out = out[0]
+                mi = out.amin(dim=(1, 2, 3), keepdim=True)
+                ma = out.amax(dim=(1, 2, 3), keepdim=True)
+                out = (out - mi) / (ma - mi)
+            out = (out.float() * 255.0).clamp(0, 255).to(torch.uint8)[:, 0].cpu().numpy()
+            ready.synchronize()
+            _release_pinned(buf)
+            for im, m in zip(chunk, out):
+                masks.append(Image.fromarray(m, "L").resize(im.size, resample))
+    return masks
+
+
+def batched_call(iface: HiInterface, pil_images: List[Image.Image],
+                 decoded: Optional[List[Optional[torch.Tensor]]] = None) -> List[Image.Image]:
+    """Remove backgrounds like iface(pil_images), batching the segmentation stage on device.
+
+    decoded optionally holds, per image, the same pixels already decoded on the GPU
+    (uint8 CHW RGB); those skip the host resize and upload. Falls back to the plain
+    carvekit call when GPU_PREPROCESS is off or the interface uses a pipeline
+    layout/segmentation network this path does not know.
+    """
+    if not pil_images:
+        return []
+    seg = iface.segmentation_pipeline
+    with gpu_resident(iface), torch.inference_mode():
+        if (
+            not GPU_PREPROCESS
+            or "cuda" not in str(seg.device)
+            or not isinstance(seg, (TracerUniversalB7, U2NET))
+            or iface.preprocessing_pipeline is not None
+            or iface.postprocessing_pipeline is None
+        ):
+            return iface(pil_images)
+        masks = _segment_batch(seg, pil_images, decoded or [None] * len(pil_images))
+        return iface.postprocessing_pipeline(images=pil_images, masks=masks)
+
+class _MicroBatcher:
+    """Collects images from concurrent requests and runs them through batched_call together.
+
+    A single worker thread takes the oldest queued image, then keeps collecting
+    images for the same interface for up to window_s (or until the segmentation
+    batch is full) and runs them as one batch. Images for other interfaces wait
+    for the next round. If a merged batch fails, each request's images are
+    retried on their own so one bad input only fails its own request.
+    """
+
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self.queue: "queue.Queue[Tuple]" = queue.Queue()
+        self.deferred: deque = deque()
+        self.thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, iface: HiInterface, img: Image.Image, decoded: Optional[torch.Tensor] = None,
+               group: object = None) -> Future:
+        """Queue one image; group identifies the request it belongs to."""
+        fut: Future = Future()
+        self.queue.put((iface, img, decoded, fut, group))
+        return fut
+
+    def _collect(self) -> Tuple[HiInterface, List[Tuple]]:
+        first = self.deferred.popleft() if self.deferred else self.queue.get()
+        iface = first[0]
+        max_batch = max(1, int(getattr(iface.segmentation_pipeline, "batch_size", 1)))
+        batch = [first]
+        others = deque()
+        while self.deferred:
+            item = self.deferred.popleft()
+            (batch if item[0] is iface and len(batch) < max_batch else others).append(item)
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            (batch if item[0] is iface else others).append(item)
+        self.deferred = others
+        return iface, batch
+
+    def _run(self) -> None:
+        while True:
+            iface, batch = self._collect()
+            batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+            if batch:
+                self._process(iface, batch)
+
+    def _process(self, iface: HiInterface, batch: List[Tuple]) -> None:
         try:
-            del _INTERFACE_CACHE[old]
-        except KeyError:
-            pass
-    return iface
+            outputs = batched_call(iface, [item[1] for item in batch], [item[2] for item in batch])
+        except Exception as e:
+            groups: Dict[int, List[Tuple]] = {}
+            for item in batch:
+                groups.setdefault(id(item[4]), []).append(item)
+            if len(groups) > 1:
+                for items in groups.values():
+                    self._process(iface, items)
+                return
+            for item in batch:
+                item[3].set_exception(e)
+            return
+        for item, out in zip(batch, outputs):
+            item[3].set_result(out)
+
+
+_BATCHER = _MicroBatcher(BATCH_WINDOW_MS / 1000.0) if BATCH_WINDOW_MS > 0 else None
+
+
+def process_images(iface: HiInterface, pil_images: List[Image.Image],
+                   decoded: Optional[List[Optional[torch.Tensor]]] = None) -> List[Union[Image.Image, Exception]]:
+    """Remove backgrounds, through the micro-batcher when enabled; failures are returned per image."""
+    if not pil_images:
+        return []
+    decoded = decoded or [None] * len(pil_images)
+    if _BATCHER is None:
+        try:
+            return list(batched_call(iface, pil_images, decoded))
+        except Exception as e:
+            return [e] * len(pil_images)
+    group = object()
+    futures = [_BATCHER.submit(iface, img, dec, group) for img, dec in zip(pil_images, decoded)]
+    results: List[Union[Image.Image, Exception]] = []
+    for fut in futures:
+        try:
+            results.append(fut.result())
+        except Exception as e:
+            results.append(e)
+    return results
 
 # Initialize default interface (and optional warmup)
 interface = get_or_create_interface(DEFAULT_CARVEKIT_CONFIG)
@@ -129,16 +802,190 @@ if os.getenv("WARMUP", "0") == "1":
     try:
         from PIL import Image
         dummy = Image.new("RGB", (DEFAULT_CARVEKIT_CONFIG["seg_mask_size"], DEFAULT_CARVEKIT_CONFIG["seg_mask_size"]))
-        _ = interface([dummy])
-    except Exception:
-        pass
+        _ = batched_call(interface, [dummy])
+    except Exception as e:
+        print(f"Warmup failed: {e}")
+
+def _resolve_interface(carvekit_config: dict) -> Tuple[HiInterface, Tuple]:
+    """Return (interface, interface key) for request overrides.
+
+    Overrides that are empty or equal to the defaults reuse the default interface
+    and its precomputed key without building a merged config or touching the cache.
+    """
+    if all(DEFAULT_CARVEKIT_CONFIG.get(k) == v for k, v in carvekit_config.items()):
+        return interface, _DEFAULT_KEY
+    config = {**DEFAULT_CARVEKIT_CONFIG, **carvekit_config}
+    return get_or_create_interface(config), _normalized_interface_key(config)
 
 app = Flask(__name__, static_folder=None)
 app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
+# Let a front proxy that honours X-Sendfile stream files from disk instead of Python
+app.config["USE_X_SENDFILE"] = USE_SENDFILE
 
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _pixel_limit_error(img: Image.Image) -> Optional[str]:
+    """Error message if an opened (not yet decoded) image exceeds MAX_IMAGE_PIXELS."""
+    w, h = img.size
+    if MAX_IMAGE_PIXELS and w * h > MAX_IMAGE_PIXELS:
+        return f"Image too large ({w}x{h}); limit is {MAX_IMAGE_PIXELS} pixels"
+    return None
+
+
+def _jpeg_draft_scale(size: Tuple[int, int], iface: HiInterface) -> int:
+    """Largest JPEG DCT scale (1, 2, 4 or 8) whose reduced size still covers the model input.
+
+    The target is the matting input size when the interface has a matting stage
+    (it sees the full-resolution image), else twice the segmentation size. Same
+    rule as Pillow's JpegImageFile.draft, so every decode backend agrees.
+    """
+    if not JPEG_DRAFT:
+        return 1
+    matting = getattr(iface.postprocessing_pipeline, "matting_module", None)
+    if matting is not None:
+        target = max(matting.input_image_size)
+    else:
+        target = max(iface.segmentation_pipeline.input_image_size) * 2
+    fit = min(size[0] // target, size[1] // target)
+    for scale in (8, 4, 2):
+        if fit >= scale:
+            return scale
+    return 1
+
+
+def _draft_jpeg(img: Image.Image, iface: HiInterface) -> None:
+    """Let libjpeg decode at the reduced DCT scale from _jpeg_draft_scale."""
+    if img.format != "JPEG":
+        return
+    scale = _jpeg_draft_scale(img.size, iface)
+    if scale > 1:
+        img.draft("RGB", (img.width // scale, img.height // scale))
+
+
+def _draft_jpeg_tensor(t: torch.Tensor, iface: HiInterface) -> torch.Tensor:
+    """Apply the _draft_jpeg reduction to an nvJPEG-decoded CHW uint8 tensor (box filter on device)."""
+    h, w = t.shape[1], t.shape[2]
+    scale = _jpeg_draft_scale((w, h), iface)
+    if scale == 1:
+        return t
+    out_size = ((h + scale - 1) // scale, (w + scale - 1) // scale)
+    return F.interpolate(t[None].float(), size=out_size, mode="area")[0].round_().clamp_(0, 255).to(torch.uint8)
+
+
+def _ensure_rgb(img: Image.Image) -> Image.Image:
+    """Return img as RGB/RGBA; grayscale is expanded with a NumPy broadcast, other modes via Pillow."""
+    if img.mode in ("RGB", "RGBA"):
+        return img
+    if img.mode == "L":
+        arr = np.asarray(img)
+        return Image.fromarray(np.ascontiguousarray(np.broadcast_to(arr[..., None], arr.shape + (3,))), "RGB")
+    return img.convert("RGB")
+
+
+def _upload_source(f):
+    """Return a seekable file object positioned at the start of an uploaded file.
+
+    Uses werkzeug's spooled stream directly; falls back to a BytesIO copy if the
+    stream can't be rewound.
+    """
+    try:
+        f.stream.seek(0)
+        return f.stream
+    except (AttributeError, OSError, ValueError):
+        return BytesIO(f.read())
+
+
+def _stream_digest(fp) -> str:
+    """Hash a seekable stream in chunks and rewind it."""
+    h = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: fp.read(1 << 20), b""):
+        h.update(chunk)
+    fp.seek(0)
+    return h.hexdigest()
+
+
+def _decode_jpegs_cuda(raws: List[bytes]) -> List[Optional[torch.Tensor]]:
+    """Decode JPEG bytes to uint8 CHW RGB tensors on the GPU; None where nvJPEG fails."""
+    with warnings.catch_warnings():
+        # Wrap the bytes without a copy; decode_jpeg only reads them
+        warnings.simplefilter("ignore", UserWarning)
+        tensors = [torch.frombuffer(raw, dtype=torch.uint8) for raw in raws]
+    try:
+        return list(decode_jpeg(tensors, mode=ImageReadMode.RGB, device="cuda"))
+    except Exception:
+        pass  # older torchvision without batched decode, or one bad file in the batch
+    out: List[Optional[torch.Tensor]] = []
+    for t in tensors:
+        try:
+            out.append(decode_jpeg(t, mode=ImageReadMode.RGB, device="cuda"))
+        except Exception:
+            out.append(None)
+    return out
+
+
+@functools.lru_cache(maxsize=64)
+def _alpha_lut(alpha_threshold: int, alpha_curve: int) -> np.ndarray:
+    """256-entry alpha LUT: zero below alpha_threshold, then ramp up to the original value over alpha_curve levels."""
+    lut = np.arange(256, dtype=np.float32)
+    lut[:alpha_threshold] = 0
+    if alpha_curve > 0:
+        end = min(256, alpha_threshold + alpha_curve)
+        lut[alpha_threshold:end] *= np.arange(end - alpha_threshold, dtype=np.float32) / alpha_curve
+    return np.rint(lut).astype(np.uint8)
+
+
+def _accepts_webp() -> bool:
+    """Whether the current request's client asked for WebP and we're allowed to send it."""
+    return WEBP_OUTPUT and "image/webp" in request.headers.get("Accept", "")
+
+
+def _save_one(out_img: Image.Image, meta: Dict, post_args: Tuple[int, float, int], per_item_ms: int,
+              output_format: str = "png") -> Dict:
+    """Apply alpha post-processing to one output and save it under PROCESSED_DIR as PNG or WebP."""
+    alpha_threshold, feather_radius, alpha_curve = post_args
+    try:
+        if out_img.mode != "RGBA":
+            out_img = out_img.convert("RGBA")
+
+        # Post-process: alpha threshold/curve (one LUT pass) and feathering
+        if alpha_threshold > 0 or alpha_curve > 0 or feather_radius > 0.0:
+            arr = np.array(out_img)
+            a = arr[..., 3]
+            if alpha_threshold > 0 or alpha_curve > 0:
+                a = _alpha_lut(alpha_threshold, alpha_curve)[a]
+            if feather_radius > 0.0:
+                if cv2 is not None:
+                    a = cv2.GaussianBlur(a, ksize=(0, 0), sigmaX=feather_radius, borderType=cv2.BORDER_REPLICATE)
+                else:
+                    from PIL import ImageFilter
+                    a = np.asarray(Image.fromarray(a, "L").filter(ImageFilter.GaussianBlur(radius=feather_radius)))
+            arr[..., 3] = a
+            out_img = Image.fromarray(arr, "RGBA")
+
+        out_name = f"{uuid.uuid4().hex}.{output_format}"
+        out_path = os.path.join(PROCESSED_DIR, out_name)
+        if output_format == "webp":
+            _save_webp(out_img, out_path)
+        elif _reserve_recompress(out_img):
+            # Respond with a quick level-1 PNG; it stays valid while zopflipng works on a copy
+            try:
+                _save_png(out_img, out_path, compress_level=1)
+            except Exception:
+                _RECOMPRESS_SLOTS.release()
+                raise
+            _RECOMPRESS_QUEUE.put(out_path)
+        else:
+            _save_png(out_img, out_path)
+        return {
+            "ok": True,
+            "name": meta.get("name", "image"),
+            "url": f"/processed/{out_name}",
+            "ms": per_item_ms,
+        }
+    except Exception as e:
+        return {"ok": False, "name": meta.get("name", "image"), "error": f"Save failed: {str(e)}"}
+
 @app.get("/health")
 def health():
     return jsonify(status="ok"), 200
@@ -159,6 +1006,16 @@ def info():
         fp16=DEFAULT_CARVEKIT_CONFIG["fp16"],
         tf32=getattr(torch.backends.cuda.matmul, "allow_tf32", False) if torch.cuda.is_available() else False,
         png_compress_level=PNG_COMPRESS_LEVEL,
+        torch_compile=TORCH_COMPILE,
+        gpu_preprocess=GPU_PREPROCESS,
+        channels_last=CHANNELS_LAST,
+        nvjpeg=NVJPEG,
+        offload_interfaces=OFFLOAD_INTERFACES,
+        batch_window_ms=BATCH_WINDOW_MS,
+        cuda_graphs=CUDA_GRAPHS and not TORCH_COMPILE and torch.cuda.is_available(),
+        png_recompress=PNG_RECOMPRESS,
+        webp_output=WEBP_OUTPUT,
+        png_encoder="libvips" if pyvips is not None else "pillow",
     ), 200
 
 @app.get("/")
@@ -175,7 +1032,10 @@ def style_css():
 
 @app.get("/processed/<path:filename>")
 def get_processed(filename: str):
-    return send_from_directory(PROCESSED_DIR, filename)
+    if os.path.basename(filename).startswith("."):
+        abort(404)  # don't expose the result cache sidecar
+    # conditional=True: ETag/Range support; the body is a file wrapper so WSGI servers can sendfile(2) it
+    return send_from_directory(PROCESSED_DIR, filename, conditional=True)
 
 @app.post("/upload")
 def upload():
@@ -217,32 +1077,56 @@ def upload():
         return jsonify(error="No files uploaded"), 400
 
     # Create/retrieve interface with custom config if provided (cached)
-    processing_interface = get_or_create_interface({**DEFAULT_CARVEKIT_CONFIG, **carvekit_config}) if carvekit_config else interface
+    processing_interface, interface_key = _resolve_interface(carvekit_config)
 
     # Post-process controls (do not affect interface key)
     try:
         feather_radius = float(request.args.get('feather_radius', '0'))
         alpha_threshold = int(request.args.get('alpha_threshold', '0'))
+        # Soft ramp width above the threshold instead of a hard cut (0 = hard threshold)
+        alpha_curve = int(request.args.get('alpha_curve', '0'))
         feather_radius = max(0.0, min(8.0, feather_radius))
         alpha_threshold = max(0, min(255, alpha_threshold))
+        alpha_curve = max(0, min(255, alpha_curve))
     except Exception:
-        feather_radius, alpha_threshold = 0.0, 0
+        feather_radius, alpha_threshold, alpha_curve = 0.0, 0, 0
 
     # Read images first to batch the processing for speed
+    post_args = (alpha_threshold, feather_radius, alpha_curve)
+    output_format = "webp" if _accepts_webp() else "png"
     pil_images: List[Image.Image] = []
     file_metas: List[Dict] = []
+    jpeg_slots: List[Tuple[int, int, bytes]] = []  # (file_metas idx, pil_images idx, raw bytes) for nvJPEG
     for f in files:
         original_name = secure_filename(f.filename or "")
         if not original_name or not allowed_file(original_name):
             file_metas.append({"ok": False, "name": original_name or "unknown", "error": "Unsupported or empty filename"})
             continue
 
+        meta = {"ok": True, "name": original_name}
         try:
-            # Read into Pillow safely
-            # Copy stream to BytesIO to avoid issues with some werkzeug streams
-            buf = BytesIO(f.read())
-            buf.seek(0)
-            img = Image.open(buf)
+            # Decode straight from the upload stream (no extra in-memory copy)
+            src = _upload_source(f)
+            if RESULT_CACHE_SIZE:
+                meta["cache_key"] = _result_cache_key(_stream_digest(src), interface_key, post_args + (output_format,))
+                meta["cached"] = _result_cache_get(meta["cache_key"])
+                if meta["cached"]:
+                    file_metas.append(meta)
+                    continue
+            img = Image.open(src)  # parses the header only
+            # Reject oversized images before paying for a full decode
+            size_error = _pixel_limit_error(img)
+            if size_error:
+                file_metas.append({"ok": False, "name": original_name, "error": size_error})
+                continue
+            if NVJPEG and img.format == "JPEG":
+                # Decoded below in one batched nvJPEG call
+                src.seek(0)
+                jpeg_slots.append((len(file_metas), len(pil_images), src.read()))
+                pil_images.append(None)
+                file_metas.append(meta)
+                continue
+            _draft_jpeg(img, processing_interface)
             img.load()  # force load
         except UnidentifiedImageError:
             file_metas.append({"ok": False, "name": original_name, "error": "Invalid image data"})
@@ -251,59 +1135,65 @@ def upload():
             file_metas.append({"ok": False, "name": original_name, "error": f"Failed to read image: {str(e)}"})
             continue
         # Ensure consistent mode for rembg
-        if img.mode not in ("RGB", "RGBA"):
-            img = img.convert("RGB")
+        img = _ensure_rgb(img)
         pil_images.append(img)
-        file_metas.append({"ok": True, "name": original_name})
-
-    # If no valid images remain
-    if not pil_images:
-        return jsonify(results=file_metas), 200
+        file_metas.append(meta)
 
-    # Batch process
-    start_batch = time.time()
-    try:
-        processed_images = processing_interface(pil_images)
-    except Exception as e:
-        # Mark all as failed
-        failed = [{"ok": False, "name": m.get("name", "unknown"), "error": f"Processing failed: {str(e)}"} for m in file_metas]
-        return jsonify(results=failed), 200
+    # Batched GPU decode of JPEGs; anything nvJPEG rejects goes through Pillow
+    decoded: List[Optional[torch.Tensor]] = [None] * len(pil_images)
+    if jpeg_slots:
+        gpu_images = _decode_jpegs_cuda([raw for _, _, raw in jpeg_slots])
+        for (meta_idx, pil_idx, raw), t in zip(jpeg_slots, gpu_images):
+            try:
+                if t is not None:
+                    t = _draft_jpeg_tensor(t, processing_interface)
+                    # carvekit's matting stage still needs a host copy of the full image
+                    pil_images[pil_idx] = Image.fromarray(t.permute(1, 2, 0).cpu().numpy(), "RGB")
+                    decoded[pil_idx] = t
+                else:
+                    img = Image.open(BytesIO(raw))
+                    _draft_jpeg(img, processing_interface)
+                    img.load()
+                    pil_images[pil_idx] = _ensure_rgb(img)
+            except Exception:
+                file_metas[meta_idx] = {"ok": False, "name": file_metas[meta_idx]["name"], "error": "Invalid image data"}
+        keep = [i for i, im in enumerate(pil_images) if im is not None]
+        pil_images = [pil_images[i] for i in keep]
+        decoded = [decoded[i] for i in keep]
 
-    elapsed_total = (time.time() - start_batch) * 1000.0
-    per_item_ms = int(elapsed_total / max(1, len(processed_images)))
+    # Batch process (cache hits are skipped entirely)
+    processed_images: List[Union[Image.Image, Exception]] = []
+    per_item_ms = 0
+    if pil_images:
+        start_batch = time.time()
+        processed_images = process_images(processing_interface, pil_images, decoded)
+        elapsed_total = (time.time() - start_batch) * 1000.0
+        per_item_ms = int(elapsed_total / max(1, len(pil_images)))
 
-    # Save outputs with optional post-process
-    results: List[Dict] = []
-    for idx, out_img in enumerate(processed_images):
-        meta = file_metas[idx]
+    # Post-process and encode outputs in parallel (PNG encoding releases the GIL)
+    outputs = iter(processed_images)
+    pending: List = []
+    for meta in file_metas:
+        name = meta.get("name", "image")
         if not meta.get("ok"):
-            results.append(meta)
-            continue
-        try:
-            if out_img.mode != "RGBA":
-                out_img = out_img.convert("RGBA")
-
-            # Post-process: alpha threshold and feathering
-            if alpha_threshold > 0 or feather_radius > 0.0:
-                r, g, b, a = out_img.split()
-                if alpha_threshold > 0:
-                    a = a.point(lambda px: 0 if px < alpha_threshold else px)
-                if feather_radius > 0.0:
-                    from PIL import ImageFilter
-                    a = a.filter(ImageFilter.GaussianBlur(radius=feather_radius))
-                out_img = Image.merge("RGBA", (r, g, b, a))
-
-            out_name = f"{uuid.uuid4().hex}.png"
-            out_path = os.path.join(PROCESSED_DIR, out_name)
-            out_img.save(out_path, format="PNG", optimize=True, compress_level=PNG_COMPRESS_LEVEL)
-            results.append({
-                "ok": True,
-                "name": meta.get("name", "image"),
-                "url": f"/processed/{out_name}",
-                "ms": per_item_ms,
-            })
-        except Exception as e:
-            results.append({"ok": False, "name": meta.get("name", "image"), "error": f"Save failed: {str(e)}"})
+            pending.append(meta)
+        elif meta.get("cached"):
+            pending.append({"ok": True, "name": name, "url": f"/processed/{meta['cached']}", "ms": 0, "cached": True})
+        else:
+            out_img = next(outputs)
+            if isinstance(out_img, Exception):
+                pending.append({"ok": False, "name": name, "error": f"Processing failed: {str(out_img)}"})
+            else:
+                pending.append(_ENCODE_POOL.submit(_save_one, out_img, meta, post_args, per_item_ms, output_format))
+    results: List[Dict] = [p.result() if isinstance(p, Future) else p for p in pending]
+
+    new_entries = [
+        (meta["cache_key"], res["url"].rsplit("/", 1)[-1])
+        for meta, res in zip(file_metas, results)
+        if res.get("ok") and meta.get("cache_key") and not meta.get("cached")
+    ]
+    if new_entries:
+        _result_cache_put(new_entries)
 
     return jsonify(results=results), 200
 
@@ -339,25 +1229,34 @@ def remove_background_single():
         return jsonify(error="Unsupported file type"), 400
 
     # Create/retrieve interface
-    processing_interface = get_or_create_interface({**DEFAULT_CARVEKIT_CONFIG, **carvekit_config}) if carvekit_config else interface
+    processing_interface, _ = _resolve_interface(carvekit_config)
 
     try:
-        buf = BytesIO(file.read())
-        buf.seek(0)
-        img = Image.open(buf)
+        img = Image.open(_upload_source(file))
+        size_error = _pixel_limit_error(img)
+        if size_error:
+            return jsonify(error=size_error), 400
+        _draft_jpeg(img, processing_interface)
         img.load()
-        if img.mode not in ("RGB", "RGBA"):
-            img = img.convert("RGB")
+        img = _ensure_rgb(img)
         # Process image with carvekit using the appropriate interface
-        processed_images = processing_interface([img])
-        out_img = processed_images[0]
+        out_img = process_images(processing_interface, [img])[0]
+        if isinstance(out_img, Exception):
+            raise out_img
         if out_img.mode != "RGBA":
             out_img = out_img.convert("RGBA")
 
         img_byte_arr = BytesIO()
-        out_img.save(img_byte_arr, format="PNG", optimize=True, compress_level=PNG_COMPRESS_LEVEL)
+        if _accepts_webp():
+            _save_webp(out_img, img_byte_arr)
+            mimetype = "image/webp"
+        else:
+            _save_png(out_img, img_byte_arr)
+            mimetype = "image/png"
         img_byte_arr.seek(0)
-        return send_file(img_byte_arr, mimetype="image/png")
+        response = send_file(img_byte_arr, mimetype=mimetype)
+        response.vary.add("Accept")
+        return response
     except UnidentifiedImageError:
         return jsonify(error="Invalid image data"), 400
     except Exception as e:
@@ -174,6 +174,8 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const response = await fetch(`/upload?${params.toString()}`, {
                 method: 'POST',
+                // Advertise WebP support so results come back as smaller WebP files
+                headers: { 'Accept': 'application/json, image/webp' },
                 body: formData
             });
 